@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
+import json
 import subprocess
 import sys
 import os
-import yaml
+from concurrent.futures import ThreadPoolExecutor
 
 # get the directory where this script lives
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,37 +19,33 @@ def get_models():
 
 def get_info(model):
     out = subprocess.check_output(
-        [sys.executable, CATALOG, "info", model],
+        [sys.executable, CATALOG, "info", model, "--format", "json"],
         text=True
     )
-    data = yaml.safe_load(out)
-    # Post-process: ensure each ensemble’s vars is a list
-    for scenario, ensembles in data.items():
-        for ens, vars_blob in ensembles.items():
-            if isinstance(vars_blob, str):
-                # split on commas and strip whitespace
-                vars_list = [v.strip() for v in vars_blob.split(",") if v.strip()]
-                data[scenario][ens] = vars_list
-    return data
+    # {scenario: {ensemble: [vars]}}
+    return json.loads(out)
 
 def main():
     models = get_models()
 
-    # print Markdown table header
-    print("| Model       | Scenario   | Ensemble   | Variables                                                   |")
-    print("| ----------- | ---------- | ---------- | ------------------------------------------------------------ |")
+    # Markdown table header
+    rows = [
+        "| Model       | Scenario   | Ensemble   | Variables                                                   |",
+        "| ----------- | ---------- | ---------- | ------------------------------------------------------------ |",
+    ]
 
-    for model in models:
-        info = get_info(model)
+    # each get_info is an independent subprocess, so run a few side by side;
+    # each one already crawls with its own pool of catalogue requests
+    with ThreadPoolExecutor(max_workers=min(4, len(models) or 1)) as ex:
+        infos = list(ex.map(get_info, models))
+
+    for model, info in zip(models, infos):
         for scenario, ensembles in info.items():
             for ens, vars_list in ensembles.items():
                 vars_str = ", ".join(vars_list)
-                print(f"| {model} | {scenario} | {ens} | {vars_str} |")
+                rows.append(f"| {model} | {scenario} | {ens} | {vars_str} |")
+
+    sys.stdout.write("\n".join(rows) + "\n")
 
 if __name__ == "__main__":
-    try:
-        import yaml
-    except ImportError:
-        print("Please install PyYAML: pip install pyyaml", file=sys.stderr)
-        sys.exit(1)
     main()
\ No newline at end of file
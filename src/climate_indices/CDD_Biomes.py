@@ -8,18 +8,40 @@ thresholds and aggregation (annual, monthly, seasonal).
 """
 
 from pathlib import Path
-import glob, time
+import glob, hashlib, time
 import numpy as np
 import pandas as pd
 import xarray as xr
 import geopandas as gpd
-import regionmask
 import matplotlib.pyplot as plt
-from xclim.core.indicator import registry
 from dask.diagnostics import ProgressBar
 import dask
-import warnings
-warnings.filterwarnings("ignore", message="Class CDD already exists and will be overwritten.")
+from common import bbox_subset, group_by_model, native_threshold, threaded_scheduler
+from raster import rasterize_polygons
+from spells import SPELL_CHUNKS, max_cdd
+
+
+def biome_labels(geometries, template, shapefile, cache_dir):
+    """
+    Flat integer biome label per grid cell (-1 outside all biomes).
+
+    Rasterizing the polygons is the slow part, so the result is cached as
+    .npy keyed by grid shape, grid bounds and the shapefile's mtime.
+    """
+    lat, lon = template["lat"].values, template["lon"].values
+    key = (lat.size, lon.size, float(lat.min()), float(lat.max()),
+           float(lon.min()), float(lon.max()), shapefile.stat().st_mtime)
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+    cache_path = cache_dir / f"labels_{lat.size}x{lon.size}_{digest}.npy"
+
+    if cache_path.exists():
+        return np.load(cache_path, mmap_mode="r")
+
+    labels = rasterize_polygons(geometries, lon, lat).ravel()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    np.save(cache_path, labels)
+    return labels
+
 
 def run(cfg):
     start_time = time.time()
@@ -30,6 +52,7 @@ def run(cfg):
     lon_bounds = [cfg["region"]["lon_min"], cfg["region"]["lon_max"]]
     threshold  = cfg["cdd"].get("threshold_mm", 1.0)
     aggr       = cfg["cdd"].get("aggregation", "annual")
+    thr_native = native_threshold(threshold)
 
     aggr_map = {"monthly": "MS", "seasonal": "QS-DEC", "annual": "YS"}
     aggr_code = aggr_map.get(aggr, "YS")
@@ -38,82 +61,93 @@ def run(cfg):
     DATA_DIR   = ROOT / "data" / "pr"
     SHAPEFILE  = ROOT / "climate_regions" / "cleaned_clim_reg_2025_06_30.shp"
     TOWNS_CSV  = ROOT / "cities" / "cities.csv"
+    CACHE_DIR  = ROOT / "data" / "cache"
 
-    print(" Loading shapefile and region mask...")
-    bioregions = gpd.read_file(SHAPEFILE).to_crs("EPSG:4326")
-    region_mask = regionmask.Regions(
-        outlines=bioregions.geometry,
-        names=bioregions["Veg_Biome"],
-        abbrevs=bioregions["Veg_Biome"],
-        name="Bioregions",
-    )
+    print(" Loading shapefile...")
+    bioregions = gpd.read_file(SHAPEFILE, engine="pyogrio", use_arrow=True).to_crs("EPSG:4326")
+    biome_names = bioregions["Veg_Biome"].tolist()
 
     nc_files = sorted(Path(p).resolve() for p in glob.glob(str(DATA_DIR / "**/historical/*.nc"), recursive=True))
     print(f" Found {len(nc_files)} historical NetCDF files.\n")
 
-    model_data, model_names = [], []
+    # Group the yearly files by model so each model is opened as one series
+    model_files = group_by_model(nc_files, "historical")
+
+    subset = bbox_subset(lat_bounds, lon_bounds)
 
-    CDD = registry.get("CDD")
-    if CDD is None:
-        raise RuntimeError("❌ 'CDD' indicator not registered in xclim.")
+    model_data, model_names, all_missing = [], [], []
 
-    for i, nc_file in enumerate(nc_files, 1):
-        print(f" [{i}/{len(nc_files)}] Processing: {nc_file.name}")
+    for i, (model_name, files) in enumerate(sorted(model_files.items()), 1):
+        print(f" [{i}/{len(model_files)}] Processing: {model_name} ({len(files)} files)")
         try:
-            ds = xr.open_dataset(nc_file, chunks={"time": -1})
-            ds = ds.sel(lat=slice(*lat_bounds), lon=slice(*lon_bounds))
+            ds = xr.open_mfdataset(
+                files, preprocess=subset, combine="by_coords", parallel=True,
+                chunks=SPELL_CHUNKS, engine="h5netcdf",
+            )
 
             if "pr" not in ds:
                 raise ValueError("Missing 'pr' variable in dataset.")
 
-            pr = ds["pr"] * 86400.0
-            pr.attrs["units"] = "mm/day"
+            # pr stays in kg m-2 s-1; the mm/day threshold is converted instead
+            pr = ds["pr"].chunk(SPELL_CHUNKS).astype(np.float32)
 
             try:
-                
-                cdd_instance = CDD()  # instantiate the indicator
-                pr.attrs["cell_methods"] = "time: mean"
-                pr.attrs["standard_name"] = "precipitation_flux"
-                cdd_result = cdd_instance(pr=pr, thresh=f"{threshold} mm/day", freq=aggr_code)
-                cdd_result = cdd_result.compute()
-
-                if cdd_result.isnull().all():
-                    raise ValueError("All CDD values are NaN.")
-
+                cdd_result = max_cdd(pr, thr=thr_native, freq=aggr_code)
                 cdd_mean = cdd_result.mean(dim="time")
             except Exception as cdd_err:
                 raise RuntimeError(f"❌ Failed during CDD calculation: {cdd_err}")
 
-            mask_da = region_mask.mask(cdd_mean)
-            reg_cdd = cdd_mean.groupby(mask_da).mean()
-
-            try:
-                idx = nc_file.parts.index("historical")
-                model_name = nc_file.parts[idx - 1]
-            except ValueError:
-                model_name = nc_file.stem.split("_")[2]
-
-            model_data.append(reg_cdd)
+            model_data.append(cdd_mean)
             model_names.append(model_name)
+            all_missing.append(pr.isnull().all())
 
 
         except Exception as e:
-            print(f"❌ Error processing {nc_file.name}: {e}\n")
+            print(f"❌ Error processing {model_name}: {e}\n")
 
     if not model_data:
         raise RuntimeError("❌ No datasets processed successfully.")
 
     print(" Computing ensemble means with Dask...")
-    with ProgressBar():
-        computed_data = dask.compute(*model_data)
+    with threaded_scheduler(), ProgressBar():
+        computed_data, missing = dask.compute(model_data, all_missing)
+
+    # Models whose precipitation is entirely NaN are dropped after the single compute
+    for model_name, is_missing in zip(model_names, missing):
+        if is_missing:
+            print(f"❌ Error processing {model_name}: All precipitation values are NaN.\n")
+    kept = [not is_missing for is_missing in missing]
+    computed_data = [data for data, keep in zip(computed_data, kept) if keep]
+    model_names = [name for name, keep in zip(model_names, kept) if keep]
+    if not computed_data:
+        raise RuntimeError("❌ No datasets processed successfully.")
+
+    # Biome labels depend only on the (shared) grid, so rasterize them once
+    n_regions = len(biome_names)
+    template = computed_data[0].transpose("lat", "lon")
+    labels = biome_labels(bioregions.geometry, template, SHAPEFILE, CACHE_DIR)
+    in_region = np.flatnonzero(labels >= 0)
+    region_labels = np.asarray(labels[in_region])
+
+    def region_means(cdd_mean):
+        # NaN-skipping group mean over the cells inside a biome
+        vals = cdd_mean.transpose("lat", "lon").values.ravel()[in_region]
+        valid = np.isfinite(vals)
+        sums = np.bincount(region_labels[valid], weights=vals[valid], minlength=n_regions)
+        counts = np.bincount(region_labels[valid], minlength=n_regions)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / counts
 
     print(" Stacking results and calculating ensemble mean...")
-    stack = xr.concat(computed_data, dim="model")
-    stack["model"] = model_names
+    stack = xr.DataArray(
+        np.stack([region_means(cdd_mean) for cdd_mean in computed_data]),
+        dims=("model", "region"),
+        coords={"model": model_names, "region": biome_names},
+    )
     ensemble_mean = stack.mean(dim="model")
 
     df = pd.DataFrame({
-        "Bioregion": region_mask.names,
+        "Bioregion": biome_names,
         "Max_CDD_days": ensemble_mean.values,
     }).sort_values("Max_CDD_days", ascending=False)
 
@@ -122,7 +156,7 @@ def run(cfg):
 
     print("\n Generating plot...")
     bioregion_mean_df = pd.DataFrame({
-        "Veg_Biome": region_mask.names,
+        "Veg_Biome": biome_names,
         "Max_CDD_days": ensemble_mean.values,
     })
     merged = bioregions.merge(bioregion_mean_df, on="Veg_Biome")
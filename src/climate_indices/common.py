@@ -0,0 +1,235 @@
+"""
+common.py
+---------------------------------------------------------------
+Helpers shared by the climate-index scripts, including the driver
+that opens each model's precipitation once and computes every
+selected index from it in a single Dask pass.
+"""
+
+from collections import defaultdict
+from pathlib import Path
+import glob, os, time
+import numpy as np
+import xarray as xr
+from dask.diagnostics import ProgressBar
+import dask
+
+AGGR_MAP = {"monthly": "MS", "seasonal": "QS-DEC", "annual": "YS"}
+
+
+def native_threshold(threshold_mm: float) -> np.float32:
+    """A mm/day threshold in the files' pr units (kg m-2 s-1)."""
+    return np.float32(threshold_mm / 86400.0)
+
+
+def threaded_scheduler():
+    """Dask config context for the threaded scheduler with one worker per CPU."""
+    return dask.config.set(scheduler="threads", num_workers=os.cpu_count())
+
+
+def model_from_path(path: Path, experiment: str) -> str:
+    """
+    Model name for a file laid out as .../<model>/<experiment>/<file>.nc,
+    falling back to the third field of the CMIP6 filename.
+    """
+    parts = path.parts
+    try:
+        return parts[parts.index(experiment) - 1]
+    except ValueError:
+        return path.stem.split("_")[2]
+
+
+def group_by_model(nc_files, experiment: str) -> dict:
+    """Map each model name to its files, resolving every path once."""
+    model_files = defaultdict(list)
+    for nc_file in nc_files:
+        model_files[model_from_path(nc_file, experiment)].append(nc_file)
+    return model_files
+
+
+def output_encoding(da, complevel: int = 3) -> dict:
+    """
+    NetCDF encoding for an ensemble-mean grid: zlib-compressed and stored
+    in tiles of at most 64 cells per dimension.
+    """
+    return {
+        "zlib": True,
+        "complevel": complevel,
+        "chunksizes": tuple(min(64, size) for size in da.shape),
+    }
+
+
+def bbox_subset(lat_bounds, lon_bounds):
+    """
+    open_mfdataset preprocess that crops each file to the bbox.
+
+    The integer lat/lon slices are found once per distinct grid (all
+    NEX-GDDP files share one) and reused, so later files skip the label
+    lookup of ``ds.sel``. Bounds are inclusive, as with ``sel(slice(...))``.
+    """
+    slices = {}
+
+    def index_slice(coord, bounds):
+        start = np.searchsorted(coord, bounds[0], side="left")
+        stop = np.searchsorted(coord, bounds[1], side="right")
+        return slice(int(start), int(stop))
+
+    def subset(ds):
+        lat, lon = ds["lat"].values, ds["lon"].values
+        grid = (lat.size, lat[0], lat[-1], lon.size, lon[0], lon[-1])
+        if grid not in slices:
+            slices[grid] = {"lat": index_slice(lat, lat_bounds), "lon": index_slice(lon, lon_bounds)}
+        return ds.isel(slices[grid])
+
+    return subset
+
+
+def index_settings(cfg, name, spec):
+    """Threshold (mm/day), aggregation label and resample code for one index."""
+    section = cfg.get(name) or {}
+    aggr = section.get("aggregation", "annual")
+    return {
+        "threshold": section.get("threshold_mm", spec["default_threshold"]),
+        "aggregation": aggr,
+        "freq": section.get("aggregation_code", AGGR_MAP.get(aggr, "YS")),
+    }
+
+
+def save_ensemble(ensemble_mean, missing, name, spec, settings, experiment, output_dir):
+    """Write a computed ensemble mean, reporting the models left out of it."""
+    label = name.upper()
+    for model_name, is_missing in zip(missing["model"].values, missing.values):
+        if is_missing:
+            print(f"⚠️ Error processing {model_name}: No valid {label} values (all NaN).")
+    if missing.all():
+        print(f"❌ No valid {label} outputs for {experiment}. Skipping.")
+        return
+
+    out_nc = output_dir / name / f"{name}_ensemble_mean_{experiment}.nc"
+    out_nc.parent.mkdir(parents=True, exist_ok=True)
+
+    unique_models = sorted(set(missing["model"].values[~missing.values].tolist()))
+    ds_out = xr.Dataset(
+        {spec["variable"]: ensemble_mean},
+        attrs={
+            "title": f"Ensemble Mean of {spec['title'].format(**settings)} - {experiment}",
+            "description": f"Threshold: {settings['threshold']} mm/day, Aggregation: {settings['aggregation']}",
+            "units": "days",
+            "models_included": ", ".join(unique_models),
+            "created_by": f"{label} processing script",
+        }
+    )
+
+    encoding = {spec["variable"]: {**output_encoding(ensemble_mean), "dtype": "float32"}}
+    ds_out.to_netcdf(out_nc, engine="h5netcdf", encoding=encoding)
+    print(f"✅ Saved {label} NetCDF → {out_nc}")
+
+
+def run_indices(cfg, indices):
+    """
+    Compute the ensemble mean of every index in ``indices`` for each
+    selected experiment.
+
+    ``indices`` maps an index name (also its config section and output
+    folder) to a spec dict with:
+
+    - ``compute(pr, threshold, freq)``: lazy per-period result from pr in
+      kg m-2 s-1, a mm/day threshold and a resample code
+    - ``variable``, ``title``: output variable name and long title (the
+      title may use ``{threshold}`` and ``{aggregation}`` placeholders)
+    - ``default_threshold``: mm/day threshold when the config has none
+
+    Each model's files are opened once and all indices share those reads
+    in one dask.compute per experiment.
+    """
+    start_time = time.time()
+    labels = ", ".join(name.upper() for name in indices)
+    print(f"Starting {labels} processing...\n")
+
+    # ───── Config ─────
+    lat_bounds = [cfg["region"]["lat_min"], cfg["region"]["lat_max"]]
+    lon_bounds = [cfg["region"]["lon_min"], cfg["region"]["lon_max"]]
+    settings = {name: index_settings(cfg, name, spec) for name, spec in indices.items()}
+
+    ROOT       = Path(__file__).resolve().parents[2]
+    DATA_DIR   = ROOT / "data" / "pr"
+    OUTPUT_DIR = ROOT / "data" / "outputs"
+
+    experiments = cfg.get("experiments", {}).get("select", ["historical"])
+
+    subset = bbox_subset(lat_bounds, lon_bounds)
+
+    for experiment in experiments:
+        print(f"\n Running experiment: {experiment}")
+
+        nc_files = sorted(Path(p).resolve() for p in glob.glob(str(DATA_DIR / f"**/{experiment}/*.nc"), recursive=True))
+        print(f"   Found {len(nc_files)} NetCDF files.")
+
+        if not nc_files:
+            print(f"⚠️  No files found for {experiment}. Skipping.\n")
+            continue
+
+        # ───── Group files per model ─────
+        model_files = group_by_model(nc_files, experiment)
+
+        print(f"{'Model':30} {'Files Found':>12}")
+        for model, files in sorted(model_files.items()):
+            print(f"{model:30} {len(files):12}")
+        print("\n")
+
+        model_names = []
+        model_data = {name: [] for name in indices}
+        all_missing = {name: [] for name in indices}
+
+        for i, (model_name, files) in enumerate(sorted(model_files.items()), 1):
+            print(f" [{i}/{len(model_files)}] Processing: {model_name} ({len(files)} files)")
+            try:
+                # Read in the files' own chunks; indices that need whole series rechunk
+                ds = xr.open_mfdataset(
+                    files, preprocess=subset, combine="by_coords", parallel=True,
+                    chunks={}, engine="h5netcdf",
+                )
+
+                if "pr" not in ds:
+                    raise ValueError("Missing 'pr' variable in dataset.")
+
+                # pr stays in kg m-2 s-1; each index converts its threshold instead
+                pr = ds["pr"]
+                results = {
+                    name: spec["compute"](pr, settings[name]["threshold"], settings[name]["freq"])
+                    for name, spec in indices.items()
+                }
+
+            except Exception as e:
+                print(f"⚠️ Error processing {model_name}: {e}")
+                continue
+
+            model_names.append(model_name)
+            pr_missing = pr.isnull().all()
+            for name, result in results.items():
+                # Day counts/lengths fit float32 exactly; this halves the ensemble pass
+                model_data[name].append(result.astype(np.float32).mean(dim="time"))
+                all_missing[name].append(pr_missing | result.isnull().all())
+
+        if not model_names:
+            print(f"❌ No valid outputs for {experiment}. Skipping.")
+            continue
+
+        # ───── Compute Ensemble Means ─────
+        print(f"\nComputing ensemble means for {experiment}...")
+        # Everything stays lazy up to the ensemble mean: all-NaN models are
+        # masked out inside the graph, so per-model grids are never gathered
+        ensembles = {}
+        for name, data in model_data.items():
+            stack = xr.concat(data, dim="model").assign_coords(model=model_names)
+            missing = xr.concat(all_missing[name], dim="model").assign_coords(model=model_names)
+            ensembles[name] = (stack.where(~missing).mean(dim="model"), missing)
+        with threaded_scheduler(), ProgressBar():
+            (ensembles,) = dask.compute(ensembles)
+
+        # ───── Save Outputs ─────
+        for name, spec in indices.items():
+            ensemble_mean, missing = ensembles[name]
+            save_ensemble(ensemble_mean, missing, name, spec, settings[name], experiment, OUTPUT_DIR)
+
+    print(f"\n All experiments completed in {round(time.time() - start_time, 1)} seconds.")
@@ -0,0 +1,65 @@
+"""
+raster.py
+---------------------------------------------------------------
+Scanline-fill rasterizer that labels grid-cell centres with the
+polygon (region) they fall in, without per-pixel shapely calls.
+"""
+
+import numpy as np
+from numba import njit, prange
+
+
+def _polygon_edges(geometries):
+    """Flatten (Multi)Polygons into (x0, y0, x1, y1) edges plus per-region offsets."""
+    edges, counts = [], []
+    for geom in geometries:
+        n_edges = 0
+        for poly in getattr(geom, "geoms", [geom]):
+            for ring in (poly.exterior, *poly.interiors):
+                xy = np.asarray(ring.coords)[:, :2]
+                edges.append(np.hstack([xy[:-1], xy[1:]]))
+                n_edges += len(xy) - 1
+        counts.append(n_edges)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return np.concatenate(edges).astype(np.float64), offsets
+
+
+@njit(parallel=True, cache=True)
+def _scanline_fill(edges, offsets, xs, ys, out):
+    """
+    Even-odd fill of each region along every row of cell centres.
+
+    Regions are burnt in order, so a later region wins where polygons overlap.
+    """
+    n_regions = offsets.shape[0] - 1
+    max_edges = np.max(offsets[1:] - offsets[:-1])
+    for r in prange(ys.shape[0]):
+        y = ys[r]
+        crossings = np.empty(max_edges)
+        for k in range(n_regions):
+            n = 0
+            for e in range(offsets[k], offsets[k + 1]):
+                x0, y0, x1, y1 = edges[e, 0], edges[e, 1], edges[e, 2], edges[e, 3]
+                if (y0 <= y) != (y1 <= y):
+                    crossings[n] = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+                    n += 1
+            if n < 2:
+                continue
+            row = np.sort(crossings[:n])
+            for p in range(0, n - 1, 2):
+                lo = np.searchsorted(xs, row[p])
+                hi = np.searchsorted(xs, row[p + 1])
+                for c in range(lo, hi):
+                    out[r, c] = k
+
+
+def rasterize_polygons(geometries, xs, ys):
+    """
+    Label each (ys[i], xs[j]) cell centre with the index of the polygon
+    containing it, or -1 if none does. ``xs`` must be increasing.
+    """
+    edges, offsets = _polygon_edges(geometries)
+    out = np.full((len(ys), len(xs)), -1, dtype=np.int32)
+    _scanline_fill(edges, offsets, np.asarray(xs, dtype=np.float64),
+                   np.asarray(ys, dtype=np.float64), out)
+    return out
@@ -0,0 +1,162 @@
+"""
+spells.py
+---------------------------------------------------------------
+Compiled spell-length kernels (maximum consecutive dry / wet days)
+shared by the climate-index scripts, with a vectorised NumPy fallback
+when Numba is not installed.
+"""
+
+import numpy as np
+import xarray as xr
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # spells fall back to the vectorised NumPy version below
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+
+# Whole time series per chunk (spell lengths are a serial scan in time), tiled in space
+SPELL_CHUNKS = {"time": -1, "lat": 64, "lon": 64}
+
+# Every fast-math flag except nnan/ninf: the kernel relies on isnan for missing days
+_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+
+@njit(
+    [
+        "void(float32[:, :, :], int64[:], float32, boolean, float32[:, :, :])",
+        "void(float64[:, :, :], int64[:], float64, boolean, float32[:, :, :])",
+    ],
+    parallel=True,
+    cache=True,
+    fastmath=_FASTMATH,
+    boundscheck=False,
+)
+def _spell_kernel(pr, starts, thr, wet, out):
+    """
+    Longest run of dry (pr < thr) or, if ``wet``, wet (pr >= thr) days in
+    each period of a (lat, lon, time) block.
+
+    Period k spans ``starts[k]:starts[k + 1]``. A period that is empty or
+    contains a NaN is set to NaN; periods the series only partly covers
+    are masked by the caller. The block is read in place, one comparison
+    per value.
+    """
+    n_lat, n_lon = pr.shape[0], pr.shape[1]
+    n_periods = starts.shape[0] - 1
+    for p in prange(n_lat * n_lon):
+        i, j = p // n_lon, p % n_lon
+        for k in range(n_periods):
+            current, longest = 0, 0
+            missing = starts[k] == starts[k + 1]
+            for t in range(starts[k], starts[k + 1]):
+                value = pr[i, j, t]
+                if np.isnan(value):
+                    missing = True
+                    break
+                current = (current + 1) * ((value < thr) != wet)
+                longest = max(longest, current)
+            out[i, j, k] = np.nan if missing else longest
+
+
+def _spell_numpy(pr, starts, thr, wet, out):
+    """
+    Vectorised equivalent of ``_spell_kernel`` for when Numba is missing.
+
+    Run lengths are a cumulative count of spell days minus its value at the
+    last reset (a non-spell day, or the eve of a period's first day), and
+    each period's maximum is one ``maximum.reduceat`` over time.
+    """
+    n_time = pr.shape[-1]
+    hit = (pr < thr) != wet
+    count = np.cumsum(hit, axis=-1, dtype=np.int32)
+    reset = np.where(hit, 0, count)
+    first_days = starts[1:-1][(starts[1:-1] > 0) & (starts[1:-1] < n_time)]
+    reset[..., first_days] = count[..., first_days] - hit[..., first_days]
+    runs = count - np.maximum.accumulate(reset, axis=-1)
+
+    # reduceat needs increasing in-range indices, so only reduce non-empty periods
+    filled = starts[:-1] < starts[1:]
+    out[...] = np.nan
+    if filled.any():
+        first = starts[:-1][filled]
+        longest = np.maximum.reduceat(runs, first, axis=-1)
+        missing = np.logical_or.reduceat(np.isnan(pr), first, axis=-1)
+        out[..., filled] = np.where(missing, np.nan, longest)
+
+
+def _period_starts(time, freq):
+    """
+    Index of the first day of each resampling period, the period labels,
+    and which periods hold fewer days than the calendar gives them.
+
+    The series may start or end part-way through a period (e.g. a DJF
+    season whose December predates the data). xclim's ``missing="any"``
+    treats such periods as missing, so they are flagged here by comparing
+    each period's day count with its full length in the series' calendar.
+    """
+    counts = xr.ones_like(time, dtype=np.int64).resample(time=freq).sum()
+    starts = np.concatenate([[0], np.cumsum(counts.values)])
+    labels = counts["time"]
+    bounds = xr.date_range(
+        labels.values[0], periods=labels.size + 1, freq=freq,
+        calendar=time.dt.calendar,
+        use_cftime=isinstance(time.to_index(), xr.CFTimeIndex),
+    )
+    full = np.array([(end - begin).days for begin, end in zip(bounds[:-1], bounds[1:])])
+    return starts, labels, counts.values < full
+
+
+def _max_spell_block(pr, starts, short, thr, wet):
+    # apply_ufunc hands over a transposed (lat, lon, time) view; reshaping it
+    # would copy the block, so the kernel indexes it as-is.
+    shape = pr.shape[:-1] + (starts.size - 1,)
+    if pr.ndim != 3:
+        pr = pr.reshape((-1, 1, pr.shape[-1]))
+    out = np.empty(pr.shape[:-1] + (starts.size - 1,), dtype=np.float32)
+    kernel = _spell_kernel if HAVE_NUMBA else _spell_numpy
+    kernel(pr, starts, pr.dtype.type(thr), wet, out)
+    out[..., short] = np.nan
+    return out.reshape(shape)
+
+
+def _max_spell(pr, thr, freq, wet):
+    starts, labels, short = _period_starts(pr["time"], freq)
+    result = xr.apply_ufunc(
+        _max_spell_block,
+        pr,
+        kwargs={"starts": starts, "short": short, "thr": thr, "wet": wet},
+        input_core_dims=[["time"]],
+        output_core_dims=[["time"]],
+        exclude_dims={"time"},
+        dask="parallelized",
+        output_dtypes=[np.float32],
+        dask_gufunc_kwargs={"output_sizes": {"time": labels.size}},
+    )
+    return result.assign_coords(time=labels).transpose("time", ...)
+
+
+def max_cdd(pr, thr, freq):
+    """
+    Maximum number of consecutive days with ``pr < thr`` per ``freq`` period.
+
+    The whole series is scanned in one call, restarting the count at each
+    period boundary; the result keeps ``time`` with one label per period.
+    Periods with a missing day, or only partly covered by the series, are
+    NaN, as with xclim's default ``missing="any"``.
+    """
+    return _max_spell(pr, thr, freq, wet=False)
+
+
+def max_cwd(pr, thr, freq):
+    """
+    Maximum number of consecutive days with ``pr >= thr`` per ``freq`` period.
+
+    Missing and partly covered periods are NaN, as in ``max_cdd``.
+    """
+    return _max_spell(pr, thr, freq, wet=True)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+warmup.py
+---------------------------------------------------------------
+Compile the Numba kernels once (e.g. right after installing the
+requirements) so their on-disk cache is populated and later index
+runs skip the compile step.
+"""
+
+import time
+import numpy as np
+from shapely.geometry import box
+
+
+def main():
+    start_time = time.time()
+    print("Compiling Numba kernels...")
+
+    # Importing spells compiles (or loads) the eagerly-typed spell kernel
+    from spells import _max_spell_block
+    from raster import rasterize_polygons
+
+    pr = np.zeros((2, 2, 4), dtype=np.float32)
+    _max_spell_block(pr, np.array([0, 4]), 1.0, False)
+    rasterize_polygons([box(0, 0, 1, 1)], np.array([0.5]), np.array([0.5]))
+
+    print(f"✅ Kernels cached in {time.time() - start_time:.1f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,36 +12,163 @@ python download_sa_subset.py \
     --variable pr \
     --start 2010 --end 2014 --grid_label gn
 """
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import argparse
+import os
+import shutil
+from urllib.parse import urlencode
 import requests
 import xarray as xr
+from nex_gddp_catalog import NexGDDPCatalog, make_session
 
 # South-Africa bounding box (WGS84)
 BBOX = dict(north=-21, south=-35, west=16, east=33)
 
-PARAMS = (
-    "?var={var}&north={north}&west={west}&east={east}&south={south}"
-    "&horizStride=1"
-    "&time_start={year}-01-01T12:00:00Z"
-    "&time_end={year}-12-31T12:00:00Z"
-    "&accept=netcdf4&addLatLon=true"
-).format(**BBOX, var="{var}", year="{year}")
+NCSS_ROOT = "https://ds.nccs.nasa.gov/thredds/ncss/grid/AMES/NEX/GDDP-CMIP6"
 
 
-def download(url: str, dest: Path):
+def url_template(model: str, experiment: str, run: str, variable: str,
+                 bbox: dict = BBOX, stride: int = 1) -> str:
+    """
+    NCSS subset URL for one model/experiment/run/variable, built once with
+    only `{filename}` and `{year}` left to fill in per request.
+    """
+    # Everything but the year is fixed, so it is encoded once here
+    fixed = urlencode({
+        "var": variable,
+        "north": bbox["north"], "west": bbox["west"],
+        "east": bbox["east"], "south": bbox["south"],
+        "horizStride": stride,
+        "accept": "netcdf4",
+        "addLatLon": "true",
+    })
+    return (
+        f"{NCSS_ROOT}/{model}/{experiment}/{run}/{variable}/{{filename}}?{fixed}"
+        "&time_start={year}-01-01T12:00:00Z&time_end={year}-12-31T12:00:00Z"
+    )
+
+
+CHUNK_SIZE  = 2**22   # 4 MiB copy buffer
+MAX_WORKERS = 8       # concurrent year downloads (and pooled connections)
+
+
+SESSION = make_session(MAX_WORKERS)
+
+
+def drop_from_page_cache(fh):
+    """
+    Flush a freshly written file and tell the kernel its pages won't be
+    reread soon, so bulk downloads don't evict other processes' cache.
+    No-op where posix_fadvise is unavailable (e.g. macOS).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fh.flush()
+    # Dirty pages can't be dropped, so write them out first
+    os.fdatasync(fh.fileno())
+    os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _validator(r) -> str:
+    """The response's strong ETag, else its Last-Modified date (for If-Range)."""
+    etag = r.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return r.headers.get("Last-Modified")
+
+
+def _range_start(r) -> int:
+    """First byte of a 206 body, from its `Content-Range: bytes a-b/n` header."""
+    try:
+        return int(r.headers["Content-Range"].split()[1].split("-")[0])
+    except (KeyError, IndexError, ValueError):
+        return -1
+
+
+def download(url: str, dest: Path, session: requests.Session = None):
     """
     Attempts to download a file from the given URL and save it to dest.
+
+    Data is written to "<dest>.part" and renamed when complete. If a .part
+    is left over from an interrupted run, only the missing bytes are
+    requested, conditional (If-Range) on the ETag or Last-Modified date
+    the server sent when the .part was started; a file that has changed
+    since, or a server that ignores the Range, resends the whole file.
     """
+    session = session or SESSION
+    # Write beside the target and rename at the end, so an interrupted
+    # transfer never leaves a truncated .nc that looks complete
+    part = dest.with_name(dest.name + ".part")
+    stamp = dest.with_name(dest.name + ".part.validator")
+    validator = stamp.read_text() if stamp.exists() else None
+    # Without a validator there's no telling whether the .part still
+    # matches the server's file, so it is only resumed with one
+    offset = part.stat().st_size if part.exists() and validator else 0
+
+    # Byte offsets only line up with the uncompressed body. Asking for gzip
+    # would gain little anyway: NCSS netcdf4 output is already deflated
+    # inside HDF5, so the transfer is dominated by incompressible chunks
+    headers = {"Accept-Encoding": "identity"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+
     print(f"↳ Attempting: {url}")
-    with requests.get(url, stream=True, timeout=600) as r:
+    with session.get(url, stream=True, timeout=600, headers=headers) as r:
+        if r.status_code == 416 or (r.status_code == 206 and _range_start(r) != offset):
+            # The leftover .part doesn't match what the server sends back;
+            # start over, handing this connection back first so a full
+            # pool can't deadlock
+            r.close()
+            part.unlink()
+            stamp.unlink(missing_ok=True)
+            return download(url, dest, session=session)
+        if not r.ok:
+            # Read the short error page (e.g. the 404 for a missing _v1.1
+            # file) so the connection goes back to the pool; closing an
+            # unread stream would drop it and force a new TLS handshake
+            r.content
         r.raise_for_status()
-        with open(dest, "wb") as fh:
-            for chunk in r.iter_content(chunk_size=2**20):
-                fh.write(chunk)
+        resumed = r.status_code == 206
+        if resumed:
+            print(f"↻ Resuming {dest.name} from byte {offset}")
+        elif _validator(r):
+            stamp.write_text(_validator(r))
+        else:
+            stamp.unlink(missing_ok=True)
+        # Copy the raw stream straight to disk instead of looping over iter_content
+        r.raw.decode_content = True
+        with open(part, "ab" if resumed else "wb") as fh:
+            shutil.copyfileobj(r.raw, fh, length=CHUNK_SIZE)
+            drop_from_page_cache(fh)
+        part.replace(dest)
+        stamp.unlink(missing_ok=True)
     print(f"✓ Saved to: {dest}")
 
 
+def is_downloaded(path: Path) -> bool:
+    """True if `path` exists and is non-empty."""
+    return path.exists() and path.stat().st_size > 0
+
+
+def catalog_files(model: str, experiment: str, run: str, variable: str,
+                  session: requests.Session = None):
+    """
+    File names THREDDS lists for one variable (from the cached catalogue),
+    or None when the catalogue can't be read.
+
+    The catalogue and NCSS live on the same host, so the lookup goes
+    through the download session and reuses its open connections.
+    """
+    try:
+        catalog = NexGDDPCatalog(session=session or SESSION)
+        return set(catalog.files(model, experiment, run, variable))
+    except Exception as e:
+        print(f"⚠️ Catalogue lookup failed for {model}/{experiment}/{run}/{variable}: {e}")
+        return None
+
+
 # ----------------------------------------------------------------------
 # Re-usable function: other scripts (e.g. run_downloads.py) can call this
 # ----------------------------------------------------------------------
@@ -57,6 +184,8 @@ def download_sa_bbox(
     bbox: dict = None,
     stride: int = 1,
     out_root: Path = Path("data"),
+    workers: int = MAX_WORKERS,
+    session: requests.Session = None,
 ):
     """
     Download a South-Africa subset for one variable & year range.
@@ -70,43 +199,67 @@ def download_sa_bbox(
     bbox                        : dict(north, south, west, east)
     stride                      : horizStride (1 = native grid)
     out_root                    : root directory for NetCDFs
+    workers                     : number of years downloaded concurrently
+    session                     : session to download with; pass one shared
+                                  session to cap transfers across callers
+
+    Returns the paths downloaded by this call, in year order.
     """
     if bbox is None:
         bbox = BBOX
 
-    params = PARAMS.replace("horizStride=1", f"horizStride={stride}")
+    url_tmpl = url_template(model, experiment, run, variable, bbox, stride)
     template = (
         f"{variable}_day_{model}_{experiment}_{run}_{grid_label}" + "_{year}.nc"
     )
 
-    for year in range(start, end + 1):
-        dest_folder = out_root / variable / model / experiment
-        dest_folder.mkdir(parents=True, exist_ok=True)
+    dest_folder = out_root / variable / model / experiment
+    dest_folder.mkdir(parents=True, exist_ok=True)
 
-        versioned = template.replace("{year}", str(year)).replace(".nc", "_v1.1.nc")
-        fallback  = template.replace("{year}", str(year))
+    # The shared session pools MAX_WORKERS connections; size a new one if more are asked for
+    if session is None:
+        session = SESSION if workers <= MAX_WORKERS else make_session(workers)
 
-        # Skip download if file already exists locally
-        ver_path  = dest_folder / versioned
-        fall_path = dest_folder / fallback
-        if ver_path.exists() or fall_path.exists():
+    def candidates(year: int):
+        """Versioned (_v1.1) and plain file names for one year, newest first."""
+        fallback = template.replace("{year}", str(year))
+        return [fallback.replace(".nc", "_v1.1.nc"), fallback]
+
+    # Skip years whose file already exists locally
+    years = []
+    for year in range(start, end + 1):
+        if any(is_downloaded(dest_folder / filename) for filename in candidates(year)):
             print(f"→ Skipping year {year} for {model}/{experiment}/{variable}, file already exists.")
-            continue
-
-        for filename in [versioned, fallback]:
-            url = (
-                f"https://ds.nccs.nasa.gov/thredds/ncss/grid/AMES/NEX/GDDP-CMIP6/"
-                f"{model}/{experiment}/{run}/{variable}/{filename}" +
-                params.format(var=variable, year=year)
-            )
+        else:
+            years.append(year)
+    if not years:
+        return []
+
+    # Look the names up once instead of probing for _v1.1 with a GET per year
+    available = catalog_files(model, experiment, run, variable, session)
+
+    def fetch_year(year: int):
+        filenames = candidates(year)
+        if available is not None:
+            # A year missing from the catalogue may just be newer than the
+            # cached copy, so only narrow the list when a name is listed
+            filenames = [name for name in filenames if name in available][:1] or filenames
+
+        for filename in filenames:
+            url = url_tmpl.format(filename=filename, year=year)
             dest = dest_folder / filename
             try:
-                download(url, dest)
-                break
+                download(url, dest, session=session)
+                return dest
             except requests.HTTPError as e:
                 print(f"{filename} not available: {e}")
             except Exception as e:
                 print(f"Error: {e}")
+        return None
+
+    # Years are independent requests, so overlap them on the shared session
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [dest for dest in pool.map(fetch_year, years) if dest is not None]
 
 
 # ----------------------------------------------------------------------
@@ -136,41 +289,26 @@ def main():
     parser.add_argument(
         "--end", type=int, required=True, help="Last year (YYYY, inclusive)"
     )
+    parser.add_argument(
+        "--workers", type=int, default=MAX_WORKERS,
+        help=f"Years downloaded concurrently (default {MAX_WORKERS})"
+    )
     args = parser.parse_args()
 
-    out_root = Path("data") / args.variable / args.model / args.experiment
-    files = []
-
-    template = (
-        f"{args.variable}_day_{args.model}_{args.experiment}_{args.run}_{args.grid_label}" + "_{year}.nc"
+    files = download_sa_bbox(
+        model=args.model,
+        experiment=args.experiment,
+        variable=args.variable,
+        start=args.start,
+        end=args.end,
+        run=args.run,
+        grid_label=args.grid_label,
+        workers=args.workers,
     )
 
-    for year in range(args.start, args.end + 1):
-        versioned = template.replace("{year}", str(year)).replace(".nc", "_v1.1.nc")
-        fallback  = template.replace("{year}", str(year))
-
-        # Skip if already downloaded
-        if (out_root / versioned).exists() or (out_root / fallback).exists():
-            print(f"→ Skipping year {year}, files already present.")
-            continue
-
-        for filename in [versioned, fallback]:
-            url = (
-                f"https://ds.nccs.nasa.gov/thredds/ncss/grid/AMES/NEX/GDDP-CMIP6/"
-                f"{args.model}/{args.experiment}/{args.run}/{args.variable}/{filename}" +
-                PARAMS.format(var=args.variable, year=year)
-            )
-            dest = out_root / filename
-            try:
-                download(url, dest)
-                files.append(dest)
-                break
-            except requests.HTTPError:
-                continue
-
     # Optional: preview merged dataset
     if files:
-        ds = xr.open_mfdataset(files, concat_dim="time")
+        ds = xr.open_mfdataset(files, combine="nested", concat_dim="time")
         print("\nDataset loaded →", ds)
 
 
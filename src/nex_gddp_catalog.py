@@ -17,80 +17,231 @@ python src/nex_gddp_catalog.py vars ACCESS-CM2 ssp585 r1i1p1f1
 
 # 4. List all file names (incl. _v1.1 etc.) for one variable & year span
 python src/nex_gddp_catalog.py files ACCESS-CM2 historical r1i1p1f1 pr
+
+Parsed pages are kept in ~/.cache/nex_gddp/catalog.sqlite for a week;
+pass --refresh to revalidate them against the server.
 """
 from __future__ import annotations
-import argparse, sys, requests, xml.etree.ElementTree as ET
+import argparse, json, sqlite3, sys, threading, time, requests, xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from urllib.parse import urljoin
-from typing import List, Set
+from typing import Dict, List, Optional, Set
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = "https://ds.nccs.nasa.gov/thredds/catalog/AMES/NEX/GDDP-CMIP6/"
+MAX_WORKERS = 8  # concurrent catalogue requests when walking a model
+CACHE_PATH = Path.home() / ".cache" / "nex_gddp" / "catalog.sqlite"
+CACHE_TTL = 7 * 24 * 3600  # seconds before a cached page is revalidated
 _NS = {"th": "http://www.unidata.ucar.edu/namespaces/thredds/InvCatalog/v1.0"}
+_CATALOG_REF = f"{{{_NS['th']}}}catalogRef"
+_DATASET = f"{{{_NS['th']}}}dataset"
+_XLINK_TITLE = "{http://www.w3.org/1999/xlink}title"
+
+
+def make_session(pool_size: int = MAX_WORKERS) -> requests.Session:
+    """
+    Session whose connection pool can serve `pool_size` threads at once,
+    so TCP/TLS connections to THREDDS are reused between requests. Further
+    threads wait for a free connection, so `pool_size` also caps how many
+    transfers run at once however many threads share the session.
+
+    Throttling (429) and transient server errors (500/502/503/504) are
+    retried with exponential backoff, honouring any Retry-After delay;
+    once retries run out the last response surfaces through
+    raise_for_status like any other HTTP error.
+    """
+    session = requests.Session()
+    retries = Retry(
+        total=5, status_forcelist=[429, 500, 502, 503, 504], backoff_factor=1,
+        respect_retry_after_header=True, raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True,
+        max_retries=retries,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class NexGDDPCatalog:
     """Tiny wrapper around the THREDDS XML catalogue."""
 
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        cache_path: Optional[Path] = CACHE_PATH,
+        ttl: float = CACHE_TTL,
+    ):
+        # Keep-alive connections for the whole crawl, retrying 429/5xx like the downloader
+        self._session = session or make_session()
+        # Names parsed from each catalogue page by URL; they only change when NASA publishes data
+        self._cache: Dict[str, Dict[str, List[str]]] = {}
+        # The same names persisted across runs (cache_path=None keeps them in memory only)
+        self._ttl = ttl
+        self._db = self._open_db(cache_path) if cache_path else None
+        self._db_lock = threading.Lock()
+
     # ---- helpers ---------------------------------------------------- #
-    def _fetch(self, url: str) -> ET.Element:
-        r = requests.get(url, timeout=30)
-        r.raise_for_status()
-        return ET.fromstring(r.text)
-
-    def _refs(self, xml_root: ET.Element) -> List[str]:
-        """Return <catalogRef> names (uses name or xlink:title)."""
-        out = []
-        for ref in xml_root.findall(".//th:catalogRef", _NS):
-            attr = ref.get("name") or ref.get("{http://www.w3.org/1999/xlink}title")
-            if attr:
-                out.append(attr)
-        return out
+    @staticmethod
+    def _open_db(path: Path) -> Optional[sqlite3.Connection]:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Shared by the `info` worker threads (guarded by _db_lock) and
+            # by concurrent CLI processes (WAL + busy timeout)
+            db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pages "
+                "(url TEXT PRIMARY KEY, fetched REAL, etag TEXT, names TEXT)"
+            )
+            db.commit()
+            return db
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ Catalogue cache unavailable ({e}); fetching pages live.", file=sys.stderr)
+            return None
+
+    def _load(self, url: str):
+        """Cached (fetched, etag, names) for a page, or None."""
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT fetched, etag, names FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return row and (row[0], row[1], json.loads(row[2]))
+
+    def _store(self, url: str, etag: Optional[str], names: Dict[str, List[str]]):
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                (url, time.time(), etag, json.dumps(names)),
+            )
+            self._db.commit()
+
+    def _fetch(self, url: str) -> Dict[str, List[str]]:
+        """
+        Stream-parse a catalogue page into its <catalogRef> ("refs") and
+        <dataset> ("datasets") names, once per URL for this instance.
+
+        Pages cached on disk within the TTL are used without a request;
+        older ones are revalidated with If-None-Match and only re-parsed
+        when the server sends a new version.
+        """
+        if url in self._cache:
+            return self._cache[url]
+
+        cached = self._load(url)
+        if cached and time.time() - cached[0] < self._ttl:
+            self._cache[url] = cached[2]
+            return cached[2]
+
+        headers = {"If-None-Match": cached[1]} if cached and cached[1] else {}
+        with self._session.get(url, timeout=30, stream=True, headers=headers) as r:
+            if r.status_code == 304:
+                etag, names = r.headers.get("ETag", cached[1]), cached[2]
+            else:
+                r.raise_for_status()
+                r.raw.decode_content = True
+                etag, names = r.headers.get("ETag"), self._parse(r.raw)
+            self._store(url, etag, names)
+        self._cache[url] = names
+        return names
+
+    @staticmethod
+    def _parse(stream) -> Dict[str, List[str]]:
+        """Collect names in document order as the XML streams in."""
+        names = {"refs": [], "datasets": []}
+        for event, el in ET.iterparse(stream, events=("start", "end")):
+            if event == "end":
+                el.clear()  # names are read at "start"; keep the tree empty
+            elif el.tag == _CATALOG_REF:
+                # <catalogRef> names use name or xlink:title
+                attr = el.get("name") or el.get(_XLINK_TITLE)
+                if attr:
+                    names["refs"].append(attr)
+            elif el.tag == _DATASET:
+                names["datasets"].append(el.get("name"))
+        return names
+
+    def _fetch_many(self, urls: List[str]) -> None:
+        """
+        Fetch several catalogue pages concurrently so later lookups hit the
+        cache; pages already cached cost nothing.
+        """
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            list(pool.map(self._fetch, urls))
+
+    @staticmethod
+    def _url(*parts: str) -> str:
+        """catalog.xml URL for a model / experiment / run / variable path."""
+        return urljoin(BASE_URL, "/".join([*parts, "catalog.xml"]))
+
+    def _refs(self, url: str) -> List[str]:
+        """Return the <catalogRef> names of a catalogue page."""
+        return self._fetch(url)["refs"]
 
     # ---- public API ------------------------------------------------- #
     def models(self) -> List[str]:
-        return sorted(self._refs(self._fetch(urljoin(BASE_URL, "catalog.xml"))))
+        return sorted(self._refs(self._url()))
 
     def experiments(self, model: str) -> List[str]:
-        return sorted(self._refs(self._fetch(urljoin(BASE_URL, f"{model}/catalog.xml"))))
+        return sorted(self._refs(self._url(model)))
 
     def runs(self, model: str, experiment: str) -> List[str]:
-        return sorted(
-            self._refs(self._fetch(urljoin(BASE_URL, f"{model}/{experiment}/catalog.xml")))
-        )
+        return sorted(self._refs(self._url(model, experiment)))
 
     def variables(self, model: str, experiment: str, run: str) -> Set[str]:
         """Return variable codes (pr, tasmax, …) — works for both catalogue layouts."""
-        run_xml = self._fetch(urljoin(BASE_URL, f"{model}/{experiment}/{run}/catalog.xml"))
+        run_page = self._fetch(self._url(model, experiment, run))
 
         # Case 1: variables appear as sub-catalogues
-        vars_cat = set(self._refs(run_xml))
+        vars_cat = set(run_page["refs"])
         if vars_cat:
             return vars_cat
 
         # Case 2: variables appear directly as <dataset> entries
-        return {
-            ds.get("name").split("_")[0]
-            for ds in run_xml.findall(".//th:dataset", _NS)
-        }
+        return {name.split("_")[0] for name in run_page["datasets"]}
 
     def files(self, model: str, experiment: str, run: str, variable: str) -> List[str]:
         """Return every dataset file name (all versions) for model / experiment / run / var."""
-        url = urljoin(BASE_URL, f"{model}/{experiment}/{run}/{variable}/catalog.xml")
-        root = self._fetch(url)
-        return [ds.get("name") for ds in root.findall(".//th:dataset", _NS)]
+        return list(self._fetch(self._url(model, experiment, run, variable))["datasets"])
+
+    def tree(self, model: str) -> Dict[str, Dict[str, List[str]]]:
+        """
+        {experiment: {run: [variables]}} for one model. Each level's pages
+        are independent, so they are fetched together before being read.
+        """
+        exps = self.experiments(model)
+        self._fetch_many([self._url(model, exp) for exp in exps])
+        pairs = [(exp, run) for exp in exps for run in self.runs(model, exp)]
+        self._fetch_many([self._url(model, exp, run) for exp, run in pairs])
+
+        info = {exp: {} for exp in exps}
+        for exp, run in pairs:
+            info[exp][run] = sorted(self.variables(model, exp, run))
+        return info
 
 
 # --------------------------------------------------------------------------- #
 # CLI                                                                         #
 # --------------------------------------------------------------------------- #
 def main():
-    cat = NexGDDPCatalog()
     p = argparse.ArgumentParser(description="Explore NEX-GDDP-CMIP6 catalogue")
+    p.add_argument("--refresh", action="store_true",
+                   help="Revalidate cached catalogue pages with the server")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     sub.add_parser("models", help="List all CMIP6 models")
 
     xp = sub.add_parser("info", help="List experiments, runs, vars for a model")
     xp.add_argument("model")
+    xp.add_argument("--format", choices=["text", "json"], default="text",
+                    help="Output format (json: {experiment: {run: [vars]}})")
 
     vr = sub.add_parser("vars", help="List variable codes for model / exp / run")
     vr.add_argument("model")
@@ -108,6 +259,7 @@ def main():
     fl.add_argument("variable")
 
     args = p.parse_args()
+    cat = NexGDDPCatalog(ttl=0 if args.refresh else CACHE_TTL)
 
     if args.cmd == "models":
         print("\n".join(cat.models()))
@@ -115,11 +267,14 @@ def main():
     elif args.cmd == "info":
         if args.model not in cat.models():
             sys.exit("Model not found.")
-        for exp in cat.experiments(args.model):
-            print(f"{exp}:")
-            for run in cat.runs(args.model, exp):
-                vars_ = ", ".join(sorted(cat.variables(args.model, exp, run))) or "—"
-                print(f"  {run}: {vars_}")
+        info = cat.tree(args.model)
+        if args.format == "json":
+            print(json.dumps(info))
+        else:
+            for exp, runs in info.items():
+                print(f"{exp}:")
+                for run, vars_ in runs.items():
+                    print(f"  {run}: {', '.join(vars_) or '—'}")
 
     elif args.cmd == "vars":
         vars_ = cat.variables(args.model, args.experiment, args.run)
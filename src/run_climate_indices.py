@@ -4,7 +4,8 @@ run_climate_indices.py
 ---------------------------------------------------
 Loads config and executes selected climate indices.
 Each index should be implemented in its own module,
-named <index>_compute.py with a compute(cfg) function.
+named <index>_compute.py with a run(cfg) function; modules
+that also expose an INDEX spec are computed together.
 """
 
 import sys
@@ -12,8 +13,6 @@ from pathlib import Path
 import importlib
 import yaml
 
-print(f"Using Python interpreter: {sys.executable}")
-
 # 1. Locate project root and config file
 def find_root(start: Path, marker: str = "climate_indices_config.yml") -> Path:
     for parent in [start.resolve(), *start.resolve().parents]:
@@ -30,24 +29,47 @@ SRC_DIR  = ROOT / "src" / "climate_indices"
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
-# 3. Load YAML config
-with CFG_PATH.open() as fh:
-    cfg = yaml.safe_load(fh)
-
-indices_to_run = cfg.get("run_indices", [])
-
-if not indices_to_run:
-    print("No indices specified in 'run_indices'. Exiting.")
-    sys.exit(0)
-
-# 4. Dynamically import and run each index module
-for index in indices_to_run:
-    module_name = f"{index}_compute"  # e.g., "cdd_compute"
-    try:
-        module = importlib.import_module(module_name)
-        print(f"\n Running index: {index.upper()} → {module_name}.py")
-        module.run(cfg)
-    except ImportError as e:
-        print(f"Could not import module '{module_name}': {e}")
-    except Exception as e:
-        print(f"Error running index '{index}': {e}")
\ No newline at end of file
+
+def main():
+    print(f"Using Python interpreter: {sys.executable}")
+
+    # 3. Load YAML config
+    with CFG_PATH.open() as fh:
+        cfg = yaml.safe_load(fh)
+
+    indices_to_run = cfg.get("run_indices", [])
+
+    if not indices_to_run:
+        print("No indices specified in 'run_indices'. Exiting.")
+        sys.exit(0)
+
+    # 4. Dynamically import each index module. Modules exposing an INDEX spec
+    #    are run together so every model's files are read once for all of them;
+    #    that single pass already spreads across every core through Dask.
+    from common import run_indices
+
+    shared = {}
+    for index in indices_to_run:
+        module_name = f"{index}_compute"  # e.g., "cdd_compute"
+        try:
+            module = importlib.import_module(module_name)
+            if hasattr(module, "INDEX"):
+                shared[index] = module.INDEX
+                continue
+            print(f"\n Running index: {index.upper()} → {module_name}.py")
+            module.run(cfg)
+        except ImportError as e:
+            print(f"Could not import module '{module_name}': {e}")
+        except Exception as e:
+            print(f"Error running index '{index}': {e}")
+
+    if shared:
+        print(f"\n Running indices: {', '.join(index.upper() for index in shared)}")
+        try:
+            run_indices(cfg, shared)
+        except Exception as e:
+            print(f"Error running indices {list(shared)}: {e}")
+
+
+if __name__ == "__main__":
+    main()
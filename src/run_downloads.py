@@ -7,8 +7,9 @@ using parameters from download_config.yml.
 """
 
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from download_sa_subset import download_sa_bbox
+from download_sa_subset import MAX_WORKERS, download_sa_bbox, make_session
 
 # 1. Locate config file
 CFG_PATH = Path(__file__).resolve().parents[1] / "download_config.yml"
@@ -30,6 +31,8 @@ bbox      = dict(
 )
 stride   = cfg["region"].get("stride", 1)
 run_id   = cfg.get("run", "r1i1p1f1")
+workers  = cfg.get("workers", MAX_WORKERS)
+jobs     = cfg.get("jobs", 4)
 
 # 3. Grid-label logic
 default_gl = cfg.get("grid_label_default", "gn")
@@ -41,7 +44,8 @@ exp_time = cfg["experiments"].get("time_ranges", {})
 hist_range = exp_time.get("historical",
                           [cfg["time"]["start_year"], cfg["time"]["end_year"]])
 
-# 5. Iterate and download
+# 5. Collect every model × experiment × variable combination
+downloads = []
 for model in cfg["models"]["select"]:
     gl = grid_map.get(model, default_gl)
 
@@ -49,8 +53,7 @@ for model in cfg["models"]["select"]:
         start, end = exp_time.get(exp, hist_range)
 
         for var in cfg["variables"]["daily"]:
-            print(f"\n=== {model} | {exp} | {var} | years {start}–{end} | grid ={gl} ===")
-            download_sa_bbox(
+            downloads.append(dict(
                 model=model,
                 experiment=exp,
                 variable=var,
@@ -58,9 +61,27 @@ for model in cfg["models"]["select"]:
                 end=end,
                 run=run_id,
                 grid_label=gl,
-                bbox=bbox,
-                stride=stride,
-                out_root=Path("data"),
-            )
+            ))
+
+# 6. Download combinations concurrently. They all share one session, whose
+#    pool lets at most `workers` transfers hit THREDDS at once in total.
+session = make_session(workers)
+
+
+def fetch(job):
+    print(f"\n=== {job['model']} | {job['experiment']} | {job['variable']} | "
+          f"years {job['start']}–{job['end']} | grid ={job['grid_label']} ===")
+    download_sa_bbox(
+        **job,
+        bbox=bbox,
+        stride=stride,
+        out_root=Path("data"),
+        workers=workers,
+        session=session,
+    )
+
+
+with ThreadPoolExecutor(max_workers=jobs) as pool:
+    list(pool.map(fetch, downloads))
 
 print("\nAll downloads completed.")
\ No newline at end of file
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
+import argparse
+import os
 import yaml
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import glob
+import netCDF4
+import numpy as np
 import pandas as pd
 
 
@@ -10,7 +15,46 @@ def count_expected_files(start, end):
     return end - start + 1  # inclusive of both start and end
 
 
+def subdirs(path):
+    """Sub-directories of `path` as (name, path) pairs."""
+    with os.scandir(path) as entries:
+        return [(e.name, e.path) for e in entries if e.is_dir()]
+
+
+def index_nc_files(data_dir):
+    """
+    List NetCDFs laid out as <data_dir>/<var>/<model>/<exp>/<var>_*.nc in
+    a single directory walk, keyed by (var, model, exp).
+    """
+    files = defaultdict(list)
+    for var, var_path in subdirs(data_dir):
+        prefix = f"{var}_"
+        for model, model_path in subdirs(var_path):
+            for exp, exp_path in subdirs(model_path):
+                with os.scandir(exp_path) as entries:
+                    files[(var, model, exp)] = [
+                        e.path for e in entries if e.name.startswith(prefix) and e.name.endswith(".nc")
+                    ]
+    return files
+
+
+def is_readable_nc(path):
+    """True if `path` opens as NetCDF and holds at least one variable."""
+    try:
+        with netCDF4.Dataset(path) as ds:
+            return len(ds.variables) > 0
+    except OSError:  # truncated HDF5, not NetCDF at all, empty file, …
+        return False
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Check downloaded NEX-GDDP files against download_config.yml")
+    parser.add_argument(
+        "--deep", action="store_true",
+        help="Also open every counted file to catch truncated or corrupt downloads"
+    )
+    args = parser.parse_args()
+
     # ───── Locate config file ─────
     CFG_PATH = Path(__file__).resolve().parents[1] / "download_config.yml"
     if not CFG_PATH.exists():
@@ -35,77 +79,53 @@ def main():
     OUTPUT_DIR.mkdir(exist_ok=True)
 
     # ───── Scan and report ─────
-    records = []
-    chart_data = []
-    per_exp_data = {}  # model → exp → [found, expected]
-    grand_total_files = 0
-
-    for model in selected_models:
-        if model not in per_exp_data:
-            per_exp_data[model] = {exp: {"found": 0, "expected": 0} for exp in experiments}
-
-        for var in variables:
-            row = {"Model": model, "Variable": var}
-            total_expected, total_found = 0, 0
-
-            for exp in experiments:
-                expected = expected_counts[exp]
-                path = DATA_DIR / var / model / exp
-                files = glob.glob(str(path / f"{var}_*.nc"))
-                found = len(files)
-
-                total_expected += expected
-                total_found += found
-                grand_total_files += found
-
-                per_exp_data[model][exp]["found"] += found
-                per_exp_data[model][exp]["expected"] += expected
-
-                if found == expected:
-                    status = "✅"
-                elif found < expected:
-                    status = f"⚠️ {found}/{expected}"
-                else:
-                    status = f"🔴 {found}/{expected}"
-
-                row[f"{exp} ({expected})"] = status
-
-            row["Total"] = f"{total_found}/{total_expected}"
-            if total_found == total_expected:
-                row["Overall"] = "✅"
-            elif total_found > total_expected:
-                row["Overall"] = "🔴"
-            else:
-                row["Overall"] = "⚠️"
-
-            records.append(row)
-
-            percent = (total_found / total_expected) * 100 if total_expected > 0 else 0
-            chart_data.append({
-                "Model": model,
-                "Variable": var,
-                "Percent Complete": percent
-            })
+    files = index_nc_files(DATA_DIR)
+
+    # found[m, v, e]: files on disk per model × variable × experiment
+    found = np.array([
+        [[len(files.get((var, model, exp), ())) for exp in experiments] for var in variables]
+        for model in selected_models
+    ], dtype=int).reshape(len(selected_models), len(variables), len(experiments))
+    expected = np.array([expected_counts[exp] for exp in experiments], dtype=int)
+
+    # Per-experiment status: ✅ when complete, else ⚠️ (missing) / 🔴 (extra) with counts
+    ratio = np.char.add(np.char.add(found.astype(str), "/"), np.broadcast_to(expected.astype(str), found.shape))
+    status = np.where(
+        found == expected, "✅",
+        np.char.add(np.where(found < expected, "⚠️ ", "🔴 "), ratio),
+    )
+
+    total_found = found.sum(axis=2).ravel()
+    total_expected = int(expected.sum())
+
+    # One row per (model, variable), model-major; every column is a flat array
+    status = status.reshape(-1, len(experiments))
+    df = pd.DataFrame({
+        "Model": np.repeat(selected_models, len(variables)),
+        "Variable": np.tile(variables, len(selected_models)),
+        **{f"{exp} ({expected_counts[exp]})": status[:, e] for e, exp in enumerate(experiments)},
+        "Total": np.char.add(total_found.astype(str), f"/{total_expected}"),
+        "Overall": np.where(
+            total_found == total_expected, "✅",
+            np.where(total_found > total_expected, "🔴", "⚠️"),
+        ),
+    })
 
     # ───── Save variable-level CSV ─────
-    df = pd.DataFrame(records)
     df.to_csv(OUTPUT_DIR / "download_verification_details.csv", index=False)
 
     # ───── Scenario-based summary ─────
-    scenario_records = []
-    for model in per_exp_data:
-        for exp in experiments:
-            found = per_exp_data[model][exp]["found"]
-            expected = per_exp_data[model][exp]["expected"]
-            percent = (found / expected) * 100 if expected > 0 else 0
-            scenario_records.append({
-                "Model": model,
-                "Scenario": exp,
-                "Percent Complete": round(percent, 1)
-            })
-
-    scenario_df = pd.DataFrame(scenario_records)
-    scenario_pivot = scenario_df.pivot(index="Model", columns="Scenario", values="Percent Complete").fillna(0)
+    # Per model × experiment, summed over variables; each variable expects the same years
+    per_exp_found = found.sum(axis=1)
+    per_exp_expected = np.broadcast_to(expected * len(variables), per_exp_found.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = np.where(per_exp_expected > 0, per_exp_found / per_exp_expected * 100, 0)
+
+    scenario_pivot = pd.DataFrame(
+        percent.round(1),
+        index=pd.Index(selected_models, name="Model"),
+        columns=pd.Index(experiments, name="Scenario"),
+    ).sort_index().sort_index(axis=1)
     scenario_pivot.to_csv(OUTPUT_DIR / "download_verification_by_scenario.csv")
 
     # ───── Output ─────
@@ -116,13 +136,36 @@ def main():
     print(f"✅ Scenario CSV saved to: {OUTPUT_DIR / 'download_verification_by_scenario.csv'}")
     
     # ───── Overall Summary ─────
-    total_found_all = sum(per_exp_data[m][e]["found"] for m in per_exp_data for e in per_exp_data[m])
-    total_expected_all = sum(per_exp_data[m][e]["expected"] for m in per_exp_data for e in per_exp_data[m])
+    total_found_all = int(per_exp_found.sum())
+    total_expected_all = int(per_exp_expected.sum())
     overall_percent = (total_found_all / total_expected_all * 100) if total_expected_all > 0 else 0
     
     print("\nTotal Files Downloaded:", total_found_all)
     print("Total Expected Files:", total_expected_all)
     print(f"Overall Completion: {overall_percent:.2f}%")
 
+    # ───── Integrity check (--deep) ─────
+    if args.deep:
+        checked = [
+            (model, var, exp, path)
+            for model in selected_models for var in variables for exp in experiments
+            for path in sorted(files.get((var, model, exp), ()))
+        ]
+        # netCDF-C/HDF5 isn't thread-safe, so files are opened in separate processes
+        with ProcessPoolExecutor() as pool:
+            readable = list(pool.map(is_readable_nc, [c[3] for c in checked], chunksize=16))
+
+        corrupt = pd.DataFrame(
+            [c for c, ok in zip(checked, readable) if not ok],
+            columns=["Model", "Variable", "Scenario", "File"],
+        )
+        corrupt.to_csv(OUTPUT_DIR / "download_verification_corrupt.csv", index=False)
+
+        print(f"\nCorrupt Files: {len(corrupt)} of {len(checked)} checked")
+        if len(corrupt):
+            print(corrupt.to_string(index=False))
+            print("Delete these files and re-run run_downloads.py to fetch just those years.")
+        print(f"✅ Corrupt-file CSV saved to: {OUTPUT_DIR / 'download_verification_corrupt.csv'}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file